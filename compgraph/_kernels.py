@@ -0,0 +1,43 @@
+"""Numeric kernels for batch mappers, haversine_batch is haversine_loop compiled with numba when it is installed
+and haversine_numpy otherwise; loop kernel matches scalar mappers exactly"""
+import importlib.util
+import math
+import typing as tp
+
+import numpy as np
+
+EARTH_RADIUS = 6373  # in km
+
+
+def haversine_loop(lng1: np.ndarray, lat1: np.ndarray, lng2: np.ndarray, lat2: np.ndarray, out: np.ndarray) -> None:
+    """Write haversine distances in km between points given in degrees into out, row by row"""
+    for i in range(out.shape[0]):
+        rlat1 = math.radians(lat1[i])
+        rlat2 = math.radians(lat2[i])
+        lat = rlat2 - rlat1
+        lng = math.radians(lng2[i]) - math.radians(lng1[i])
+        sin_lat = math.sin(lat * 0.5)
+        sin_lng = math.sin(lng * 0.5)
+        d = sin_lat * sin_lat + math.cos(rlat1) * math.cos(rlat2) * (sin_lng * sin_lng)
+        out[i] = 2 * EARTH_RADIUS * math.asin(math.sqrt(d))
+
+
+def haversine_numpy(lng1: np.ndarray, lat1: np.ndarray, lng2: np.ndarray, lat2: np.ndarray, out: np.ndarray) -> None:
+    """Write haversine distances in km between points given in degrees into out, with numpy ufuncs"""
+    rlat1 = np.radians(lat1)
+    rlat2 = np.radians(lat2)
+    lat = rlat2 - rlat1
+    lng = np.radians(lng2) - np.radians(lng1)
+    sin_lat = np.sin(lat * 0.5)
+    sin_lng = np.sin(lng * 0.5)
+    d = sin_lat * sin_lat + np.cos(rlat1) * np.cos(rlat2) * (sin_lng * sin_lng)
+    out[:] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(d))
+
+
+haversine_batch: tp.Callable[[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray], None]
+if importlib.util.find_spec('numba') is not None:
+    import numba  # type: ignore
+
+    haversine_batch = numba.njit(cache=True)(haversine_loop)
+else:
+    haversine_batch = haversine_numpy
@@ -5,16 +5,76 @@ from operator import itemgetter
 
 from . import operations as ops
 
+TSortKey = str | tuple[str, str]
 
-def do_sort(endpoint: connection.Connection, keys: tuple[str, ...]) -> None:
+
+def split_sort_keys(keys: tp.Sequence[TSortKey]) -> list[tuple[tuple[str, ...], bool]]:
+    """
+    Group consecutive sorting keys of the same direction: key is either column name (ascending)
+    or pair (column name, 'asc' | 'desc'). Returns list of (columns, descending) pairs
+    """
+    groups: list[tuple[tuple[str, ...], bool]] = []
+    for key in keys:
+        if isinstance(key, str):
+            column, direction = key, 'asc'
+        else:
+            column, direction = key
+        if direction not in ('asc', 'desc'):
+            raise ValueError(f'Unknown sort direction {direction!r} for column {column!r}')
+        descending = direction == 'desc'
+        if groups and groups[-1][1] == descending:
+            groups[-1] = (groups[-1][0] + (column,), descending)
+        else:
+            groups.append(((column,), descending))
+    return groups
+
+
+def sort_rows(rows: list[ops.TRow], keys: tp.Sequence[TSortKey], bucket: bool = False) -> list[ops.TRow]:
+    """
+    Sort rows by keys in place. Keys of different directions are sorted by stable passes starting
+    from the least significant group
+    """
+    groups = split_sort_keys(keys)
+    if len(groups) == 1 and not groups[0][1]:
+        columns = groups[0][0]
+        if bucket and rows:
+            return bucket_sort(rows, columns)
+        rows.sort(key=itemgetter(*columns))
+        return rows
+    for columns, descending in reversed(groups):
+        rows.sort(key=itemgetter(*columns), reverse=descending)
+    return rows
+
+
+def bucket_sort(rows: list[ops.TRow], keys: tuple[str, ...]) -> list[ops.TRow]:
+    """
+    Sort rows by integer first key distributing them into buckets, so that only distinct values of the first key
+    and rows inside each bucket are compared. Falls back to comparison sort for non-integer first key.
+    """
+    first_key = itemgetter(keys[0])
+    buckets: dict[int, list[ops.TRow]] = {}
+    for row in rows:
+        value = first_key(row)
+        if type(value) is not int:
+            return sorted(rows, key=itemgetter(*keys))
+        buckets.setdefault(value, []).append(row)
+    result = []
+    for value in sorted(buckets):
+        bucket = buckets[value]
+        if len(keys) > 1 and len(bucket) > 1:
+            bucket.sort(key=itemgetter(*keys[1:]))
+        result.extend(bucket)
+    return result
+
+
+def do_sort(endpoint: connection.Connection, keys: tp.Sequence[TSortKey], bucket: bool = False) -> None:
     rows = []
     while True:
         row = endpoint.recv()
         if row is None:
             break
         rows.append(row)
-    rows.sort(key=itemgetter(*keys))
-    for row in rows:
+    for row in sort_rows(rows, keys, bucket):
         endpoint.send(row)
     endpoint.send(None)
 
@@ -26,12 +86,18 @@ class ExternalSort(ops.Operation):
     This class illustrates cross-process streaming.
     """
 
-    def __init__(self, keys: tp.Sequence[str]):
+    def __init__(self, keys: tp.Sequence[TSortKey], bucket: bool = False):
+        """
+        :param keys: sorting keys, column name or pair (column name, 'asc' | 'desc')
+        :param bucket: sort by bucketing on integer first key, see bucket_sort
+        """
+        split_sort_keys(keys)
         self.keys = keys
+        self.bucket = bucket
 
     def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
         local_endpoint, remote_endpoint = Pipe()
-        process = Process(target=do_sort, args=(remote_endpoint, self.keys))
+        process = Process(target=do_sort, args=(remote_endpoint, self.keys, self.bucket))
         process.start()
         row_count_before = 0
         for row in rows:
@@ -1,8 +1,13 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import tempfile
 import typing as tp
-import json
 
 from . import operations as ops
 from . import external_sort as ext_sort
+from .json_io import loads
 
 
 class Graph:
@@ -13,7 +18,7 @@ class Graph:
     @staticmethod
     def make_graph(input_stream_name: str, file: bool = False) -> 'Graph':
         if file:
-            return Graph.graph_from_file(input_stream_name, json.loads)
+            return Graph.graph_from_file(input_stream_name, loads)
         return Graph.graph_from_iter(input_stream_name)
 
     @staticmethod
@@ -46,6 +51,23 @@ class Graph:
         graph.op = ops.AddOperation(ops.Map(mapper), self.op)
         return graph
 
+    def parallel_map(self, mapper: ops.Mapper, n_workers: int | None = None, chunk_size: int = 10_000) -> 'Graph':
+        """Construct new graph extended with map operation computed by several processes,
+        ordinary map if only one worker is requested
+        :param mapper: mapper to use
+        :param n_workers: number of worker processes, number of CPUs by default
+        :param chunk_size: number of rows sent to worker at once
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        elif n_workers < 1:
+            raise ValueError(f'n_workers must be positive, got {n_workers}')
+        if n_workers == 1:
+            return self.map(mapper)
+        graph = Graph()
+        graph.op = ops.AddOperation(ops.ParallelMap(mapper, n_workers, chunk_size), self.op)
+        return graph
+
     def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
         """Construct new graph extended with reduce operation with particular reducer
         :param reducer: reducer to use
@@ -55,14 +77,46 @@ class Graph:
         graph.op = ops.AddOperation(ops.Reduce(reducer, keys), self.op)
         return graph
 
-    def sort(self, keys: tp.Sequence[str]) -> 'Graph':
+    def hash_reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with reduce operation grouping unsorted rows in memory,
+        use instead of sort and reduce when number of groups is small
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        """
+        graph = Graph()
+        graph.op = ops.AddOperation(ops.HashReduce(reducer, keys), self.op)
+        return graph
+
+    def pre_aggregate_count(self, keys: tp.Sequence[str], count_column: str = 'count',
+                            max_entries: int = 1_000_000) -> 'Graph':
+        """Construct new graph extended with partial count of rows by keys,
+        result has to be sorted and reduced with ops.Sum over count_column
+        :param keys: keys for grouping
+        :param count_column: name for partial count column
+        :param max_entries: maximum number of keys counted in memory
+        """
+        graph = Graph()
+        graph.op = ops.AddOperation(ops.PreAggregateCount(keys, count_column, max_entries), self.op)
+        return graph
+
+    def sort(self, keys: tp.Sequence[ext_sort.TSortKey]) -> 'Graph':
         """Construct new graph extended with sort operation
-        :param keys: sorting keys (typical is tuple of strings)
+        :param keys: sorting keys (typical is tuple of strings), key may be pair (column, 'desc')
+            to sort by column in descending order
         """
         graph = Graph()
         graph.op = ops.AddOperation(ext_sort.ExternalSort(keys), self.op)
         return graph
 
+    def fast_sort(self, keys: tp.Sequence[ext_sort.TSortKey]) -> 'Graph':
+        """Construct new graph extended with sort operation bucketing rows by integer first key,
+        e.g. counts, falls back to ordinary sort otherwise
+        :param keys: sorting keys (typical is tuple of strings)
+        """
+        graph = Graph()
+        graph.op = ops.AddOperation(ext_sort.ExternalSort(keys, bucket=True), self.op)
+        return graph
+
     def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
         """Construct new graph extended with join operation with another graph
         :param joiner: join strategy to use
@@ -73,17 +127,107 @@ class Graph:
         graph.op = GraphsJoiner(ops.Join(joiner, keys), self, join_graph)
         return graph
 
+    def hash_join(self, joiner: ops.HashInnerJoiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with join operation with another graph, which does not need
+        sorted inputs: join_graph is indexed by keys in memory, so it should be the small one
+        :param joiner: hash join strategy to use
+        :param join_graph: other graph to join with
+        :param keys: keys for grouping
+        """
+        graph = Graph()
+        graph.op = GraphsJoiner(ops.HashJoin(joiner, keys), self, join_graph)
+        return graph
+
     def run(self, **kwargs: tp.Any) -> ops.TRowsIterable:
         """Single method to start execution; data sources passed as kwargs"""
         yield from self.op(**kwargs)
 
+    def run_parallel(self, n_workers: int | None = None, **kwargs: tp.Any) -> ops.TRowsIterable:
+        """Start execution computing both branches of every top level join in separate processes.
+        Branch results are materialized into temporary files and then joined in current process.
+        Processes are forked, so data sources passed as kwargs may be arbitrary callables
+        :param n_workers: maximal number of branches computed at once, number of CPUs by default
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        elif n_workers < 1:
+            raise ValueError(f'n_workers must be positive, got {n_workers}')
+        joiners = _top_level_joiners(self.op)
+        if not joiners:
+            yield from self.run(**kwargs)
+            return
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            materialized: dict[int, tuple[str, str]] = {}
+            jobs: list[tuple[Graph, str]] = []
+            for i, joiner in enumerate(joiners):
+                paths = (os.path.join(tmp_dir, f'{i}_1'), os.path.join(tmp_dir, f'{i}_2'))
+                materialized[id(joiner)] = paths
+                jobs += [(joiner.g1, paths[0]), (joiner.g2, paths[1])]
+
+            context = multiprocessing.get_context('fork')
+            for start in range(0, len(jobs), n_workers):
+                processes = [context.Process(target=_dump_rows, args=(graph, path, kwargs))
+                             for graph, path in jobs[start:start + n_workers]]
+                try:
+                    for process in processes:
+                        process.start()
+                    running = {process.sentinel: process for process in processes}
+                    while running:
+                        for sentinel in multiprocessing.connection.wait(list(running)):
+                            process = running.pop(tp.cast(int, sentinel))
+                            process.join()
+                            if process.exitcode != 0:
+                                raise RuntimeError(f'Graph branch failed with exit code {process.exitcode}')
+                finally:
+                    # on failure other branches are stopped before their temporary directory is removed
+                    for process in processes:
+                        if process.pid is not None:
+                            if process.is_alive():
+                                process.terminate()
+                            process.join()
+
+            yield from self.op(**kwargs, **{MATERIALIZED_BRANCHES: materialized})
+
+
+# kwarg with paths of files with rows of join branches precomputed by Graph.run_parallel
+MATERIALIZED_BRANCHES = '__materialized_branches__'
+
+
+def _top_level_joiners(op: ops.Operation) -> list['GraphsJoiner']:
+    """Find joins not depending on other joins' results, but possibly containing joins in their branches"""
+    if isinstance(op, GraphsJoiner):
+        return [op]
+    return [joiner for dependency in op.dependencies() for joiner in _top_level_joiners(dependency)]
+
+
+def _dump_rows(graph: Graph, path: str, kwargs: dict[str, tp.Any]) -> None:
+    with open(path, 'wb') as out:
+        for row in graph.run(**kwargs):
+            pickle.dump(row, out, pickle.HIGHEST_PROTOCOL)
+
+
+def _load_rows(path: str) -> ops.TRowsGenerator:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
 
 class GraphsJoiner(ops.Operation):
     """Join two graphs"""
-    def __init__(self, joiner: ops.Join, g1: 'Graph', g2: 'Graph') -> None:
+    def __init__(self, joiner: ops.Join | ops.HashJoin, g1: 'Graph', g2: 'Graph') -> None:
         self.joiner = joiner
         self.g1 = g1
         self.g2 = g2
 
     def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
-        yield from self.joiner(self.g1.run(**kwargs), self.g2.run(**kwargs))
+        paths = kwargs.get(MATERIALIZED_BRANCHES, {}).get(id(self))
+        if paths is not None:
+            yield from self.joiner(_load_rows(paths[0]), _load_rows(paths[1]))
+        else:
+            yield from self.joiner(self.g1.run(**kwargs), self.g2.run(**kwargs))
+
+    def dependencies(self) -> list[ops.Operation]:
+        return [self.g1.op, self.g2.op]
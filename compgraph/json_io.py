@@ -0,0 +1,54 @@
+"""JSON lines reading and writing, with orjson when it is installed: it is several times faster than json.
+Both backends produce the same output: NaN and infinities are not valid JSON, so rows with them raise ValueError
+(json would write NaN and Infinity, orjson would silently write null)"""
+import importlib.util
+import json
+import math
+import typing as tp
+
+from .operations import TRowsIterable
+
+
+def _check_finite(value: tp.Any) -> None:
+    """Raise ValueError if value has NaN or infinity inside"""
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f'Out of range float values are not JSON compliant: {value!r}')
+    elif isinstance(value, dict):
+        for item in value.values():
+            _check_finite(item)
+    elif isinstance(value, list | tuple):
+        for item in value:
+            _check_finite(item)
+
+
+def json_dumps_line(row: tp.Any) -> bytes:
+    """Serialize row into JSON line terminated with newline by json"""
+    return (json.dumps(row, allow_nan=False) + '\n').encode()
+
+
+loads: tp.Callable[[str], tp.Any]
+dumps_line: tp.Callable[[tp.Any], bytes]
+if importlib.util.find_spec('orjson') is not None:
+    import orjson
+
+    def orjson_dumps_line(row: tp.Any) -> bytes:
+        """Serialize row into JSON line terminated with newline by orjson"""
+        line = orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+        if b'null' in line:  # orjson writes NaN and infinities as null, None is told apart by full check
+            _check_finite(row)
+        return line
+
+    loads = orjson.loads
+    dumps_line = orjson_dumps_line
+else:
+    loads = json.loads
+    dumps_line = json_dumps_line
+
+
+def write_rows(rows: TRowsIterable, filepath: str) -> None:
+    """Stream rows into file as JSON lines, one row per line, without materializing them"""
+    with open(filepath, 'wb') as out:
+        write = out.write
+        for row in rows:
+            write(dumps_line(row))
@@ -1,15 +1,42 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from abc import abstractmethod, ABC
 import typing as tp
 import string
-from itertools import groupby
+import math
+from math import asin, cos, log, radians, sin, sqrt
+from functools import lru_cache
+from itertools import chain, groupby, islice
 import heapq
+from operator import itemgetter
 import numpy as np
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+
+from ._kernels import EARTH_RADIUS, haversine_batch
+
+_EARTH_DIAMETER = 2 * EARTH_RADIUS
+
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# drops punctuation and lowers ASCII letters in a single translate pass
+_TOKENIZE_TABLE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase, string.punctuation)
+# byte level versions for ASCII text: bytes.translate uses 256-entry table instead of codepoint lookups
+_PUNCTUATION_BYTES = string.punctuation.encode()
+_LOWER_BYTES_TABLE = bytes.maketrans(string.ascii_uppercase.encode(), string.ascii_lowercase.encode())
 
 
 def remove_punctuation(text: str) -> str:
-    return text.translate(str.maketrans('', '', string.punctuation))
+    if text.isascii():
+        return text.encode('ascii').translate(None, _PUNCTUATION_BYTES).decode('ascii')
+    return text.translate(_PUNCTUATION_TABLE)
+
+
+def tokenize_text(text: str) -> str:
+    """Remove punctuation and lower text"""
+    if text.isascii():
+        return text.encode('ascii').translate(_LOWER_BYTES_TABLE, _PUNCTUATION_BYTES).decode('ascii')
+    return text.translate(_TOKENIZE_TABLE).lower()
 
 
 TRow = dict[str, tp.Any]
@@ -17,11 +44,65 @@ TRowsIterable = tp.Iterable[TRow]
 TRowsGenerator = tp.Generator[TRow, None, None]
 
 
+@lru_cache(maxsize=65536)
+def weekday_and_hour(prefix: str) -> tuple[str, int]:
+    """Get weekday abbreviation and hour of timestamp by its %Y%m%dT%H prefix,
+    cached as timestamps of many trips share the same day and hour"""
+    if len(prefix) != 11 or prefix[8] != 'T':
+        raise ValueError(f"time data {prefix!r} does not match format '%Y%m%dT%H'")
+    moment = datetime.fromisoformat(f'{prefix[0:4]}-{prefix[4:6]}-{prefix[6:8]}T{prefix[9:11]}')
+    if moment.tzinfo is not None:
+        raise ValueError(f"time data {prefix!r} does not match format '%Y%m%dT%H'")
+    return moment.strftime('%a'), moment.hour
+
+
+_EPOCH = datetime(1, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def timestamp_to_us(timestamp: str) -> int:
+    """Convert timestamp in %Y%m%dT%H%M%S.%f format to microseconds since 0001-01-01.
+    Timestamp is rearranged into ISO format, parsed by datetime.fromisoformat which is implemented in C;
+    fraction of 1-6 digits is padded to 6 digits as fromisoformat of Python 3.10 accepts only 3 or 6"""
+    t = timestamp
+    if 17 <= len(t) <= 22 and t[8] == 'T' and t[15] == '.':
+        try:
+            moment = datetime.fromisoformat(
+                f'{t[0:4]}-{t[4:6]}-{t[6:8]}T{t[9:11]}:{t[11:13]}:{t[13:15]}.{t[16:].ljust(6, "0")}')
+        except ValueError:
+            pass
+        else:
+            if moment.tzinfo is None:
+                return (moment - _EPOCH) // _MICROSECOND
+    raise ValueError(f"time data {timestamp!r} does not match format '%Y%m%dT%H%M%S.%f'")
+
+
+def column_array(rows: list[TRow], column: str) -> np.ndarray:
+    """Gather column values of rows into float array"""
+    return np.fromiter(map(itemgetter(column), rows), dtype=np.float64, count=len(rows))
+
+
+def key_getter(keys: tp.Sequence[str]) -> tp.Callable[[TRow], tp.Any]:
+    """Build function extracting grouping key from row: scalar for a single key, tuple otherwise"""
+    if not keys:
+        return lambda row: ()
+    return itemgetter(*keys)
+
+
+def key_to_row(keys: tp.Sequence[str], key: tp.Any) -> TRow:
+    """Build row with key columns from grouping key extracted by key_getter"""
+    return dict(zip(keys, (key,) if len(keys) == 1 else key))
+
+
 class Operation(ABC):
     @abstractmethod
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         pass
 
+    def dependencies(self) -> list['Operation']:
+        """Operations producing rows consumed by this one"""
+        return []
+
 
 class AddOperation(Operation):
     def __init__(self, first: Operation, second: Operation) -> None:
@@ -31,6 +112,9 @@ class AddOperation(Operation):
     def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         yield from self.first(self.second(**kwargs))
 
+    def dependencies(self) -> list[Operation]:
+        return [self.second]
+
 
 class Read(Operation):
     def __init__(self, filename: str, parser: tp.Callable[[str], TRow]) -> None:
@@ -38,13 +122,14 @@ class Read(Operation):
         self.parser = parser
 
     def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        parser = self.parser
         with open(self.filename) as f:
             for line in f:
-                parsed = self.parser(line)
+                parsed = parser(line)
                 if isinstance(parsed, list):  # type: ignore
-                    yield from self.parser(line)  # type: ignore
+                    yield from parsed  # type: ignore
                 else:
-                    yield self.parser(line)
+                    yield parsed
 
 
 class ReadIterFactory(Operation):
@@ -70,15 +155,107 @@ class Mapper(ABC):
         pass
 
 
+class RowMapper(Mapper):
+    """Base class for mappers which map one row to at most one row"""
+
+    @abstractmethod
+    def apply(self, row: TRow) -> TRow | None:
+        """
+        :param row: one table row
+        :return: mapped row or None to remove the row
+        """
+        pass
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        res = self.apply(row)
+        if res is not None:
+            yield res
+
+
+class BatchMapper(RowMapper):
+    """Base class for mappers which can also process a batch of rows at once"""
+
+    @abstractmethod
+    def apply_batch(self, rows: list[TRow]) -> None:
+        """
+        :param rows: batch of table rows, mapped in place
+        """
+        pass
+
+
 class Map(Operation):
-    def __init__(self, mapper: Mapper) -> None:
+    def __init__(self, mapper: Mapper, batch_size: int = 4096) -> None:
+        """
+        :param mapper: mapper to use
+        :param batch_size: number of rows passed at once to BatchMapper
+        """
         self.mapper = mapper
+        self.batch_size = batch_size
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        for row in rows:
-            res = self.mapper(row)
-            for el in res:
-                yield el
+        if isinstance(self.mapper, BatchMapper):
+            apply_batch = self.mapper.apply_batch
+            rows = iter(rows)
+            while batch := list(islice(rows, self.batch_size)):
+                apply_batch(batch)
+                yield from batch
+        elif isinstance(self.mapper, RowMapper):
+            apply = self.mapper.apply
+            for row in rows:
+                res = apply(row)
+                if res is not None:
+                    yield res
+        else:
+            mapper = self.mapper
+            for row in rows:
+                yield from mapper(row)
+
+
+_worker_map: Map | None = None
+
+
+def _init_map_worker(mapper: Mapper) -> None:
+    global _worker_map
+    _worker_map = Map(mapper)
+
+
+def _map_chunk(rows: list[TRow]) -> list[TRow]:
+    assert _worker_map is not None
+    return list(_worker_map(rows))
+
+
+class ParallelMap(Operation):
+    """
+    Map rows in chunks by pool of forked processes, order of rows is preserved.
+    Mapper is inherited by workers, rows are sent to them and back pickled, so it pays off
+    only for mappers heavier than pickling of a row
+    """
+
+    def __init__(self, mapper: Mapper, n_workers: int, chunk_size: int = 10_000) -> None:
+        """
+        :param mapper: mapper to use
+        :param n_workers: number of worker processes
+        :param chunk_size: number of rows sent to worker at once
+        """
+        self.mapper = mapper
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        rows = iter(rows)
+        executor = ProcessPoolExecutor(self.n_workers, mp_context=multiprocessing.get_context('fork'),
+                                       initializer=_init_map_worker, initargs=(self.mapper,))
+        try:
+            # at most two chunks per worker are in flight to bound memory
+            pending: deque[Future[list[TRow]]] = deque()
+            while chunk := list(islice(rows, self.chunk_size)):
+                pending.append(executor.submit(_map_chunk, chunk))
+                if len(pending) >= 2 * self.n_workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
 
 
 class Reducer(ABC):
@@ -96,11 +273,87 @@ class Reduce(Operation):
     def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
         self.reducer = reducer
         self.keys = keys
+        self._keys_tuple = tuple(keys)
+        self._key_fn = key_getter(keys)
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        for key, group in groupby(rows, key=lambda row: [row[key] for key in self.keys]):
-            for el in self.reducer(tuple(self.keys), group):
-                yield el
+        for key, group in groupby(rows, key=self._key_fn):
+            yield from self.reducer(self._keys_tuple, group)
+
+
+class HashReduce(Operation):
+    """Reduce unsorted rows grouping them in memory, suitable when number of groups is small;
+    Count and Sum keep only accumulators, other reducers keep rows of all groups"""
+
+    def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
+        self.reducer = reducer
+        self.keys = keys
+        self._keys_tuple = tuple(keys)
+        self._key_fn = key_getter(keys)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        key_fn = self._key_fn
+        reducer = self.reducer
+        # exact type check, subclasses may override reducing logic
+        if isinstance(reducer, Count | Sum) and type(reducer) in (Count, Sum):
+            accumulators: dict[tp.Any, tp.Any] = {}
+            if isinstance(reducer, Count):
+                for row in rows:
+                    key = key_fn(row)
+                    accumulators[key] = accumulators.get(key, 0) + 1
+            else:
+                column = reducer.column
+                for row in rows:
+                    key = key_fn(row)
+                    accumulators[key] = accumulators.get(key, 0) + row[column]
+            for key, value in accumulators.items():
+                ans = key_to_row(self.keys, key)
+                ans[reducer.column] = value
+                yield ans
+        elif not self.keys:
+            iter_rows = iter(rows)
+            first_row = next(iter_rows, None)
+            if first_row is not None:
+                yield from self.reducer(self._keys_tuple, chain((first_row,), iter_rows))
+        else:
+            groups: dict[tp.Any, list[TRow]] = {}
+            for row in rows:
+                groups.setdefault(key_fn(row), []).append(row)
+            for group in groups.values():
+                yield from self.reducer(self._keys_tuple, group)
+
+
+class PreAggregateCount(Operation):
+    """Count rows by keys in memory before sorting, counts are flushed when max_entries keys are collected,
+    so the same key may occur in several output rows and has to be summed after sort"""
+
+    def __init__(self, keys: tp.Sequence[str], count_column: str = 'count', max_entries: int = 1_000_000) -> None:
+        """
+        :param keys: keys for grouping
+        :param count_column: name for partial count column
+        :param max_entries: maximum number of keys counted in memory
+        """
+        self.keys = keys
+        self.count_column = count_column
+        self.max_entries = max_entries
+        self._key_fn = key_getter(keys)
+
+    def _flush(self, counts: dict[tp.Any, int]) -> TRowsGenerator:
+        for key, count in counts.items():
+            row = key_to_row(self.keys, key)
+            row[self.count_column] = count
+            yield row
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        counts: dict[tp.Any, int] = {}
+        key_fn = self._key_fn
+        for row in rows:
+            key = key_fn(row)
+            counts[key] = counts.get(key, 0) + 1
+            if len(counts) >= self.max_entries:
+                yield from self._flush(counts)
+                counts = {}
+        yield from self._flush(counts)
 
 
 class Joiner(ABC):
@@ -119,6 +372,78 @@ class Joiner(ABC):
                     for key, value in row_b.items() if key not in keys})
         return ans
 
+    def get_layout(self, row_a: TRow, row_b: TRow,
+                   keys: tp.Sequence[str]) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+        """Get (source, result) names of non-key columns of left and right rows,
+        valid for every pair of rows with the same columns as row_a and row_b
+        :param row_a: left row
+        :param row_b: right row
+        :param keys: join keys
+        """
+        left_cols = [(key, key + self._a_suffix if key in row_b else key) for key in row_a if key not in keys]
+        right_cols = [(key, key + self._b_suffix if key in row_a else key) for key in row_b if key not in keys]
+        return left_cols, right_cols
+
+    def cross_join(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable,
+                   a_outer: bool = True) -> TRowsGenerator:
+        """Yield joined rows for every pair of left and right rows.
+        Column layout is computed once and recomputed only when columns of outer rows change;
+        if materialized rows differ in columns, every pair is joined by get_ans
+        :param keys: join keys
+        :param rows_a: left table rows, materialized unless a_outer
+        :param rows_b: right table rows, materialized if a_outer
+        :param a_outer: iterate over left rows in outer loop, otherwise over right ones
+        """
+        inner_rows = list(rows_b if a_outer else rows_a)
+        if not inner_rows:
+            return
+        first_inner = inner_rows[0]
+        if any(row.keys() != first_inner.keys() for row in inner_rows):
+            for outer_row in (rows_a if a_outer else rows_b):
+                for inner_row in inner_rows:
+                    if a_outer:
+                        yield self.get_ans(outer_row, inner_row, keys)
+                    else:
+                        yield self.get_ans(inner_row, outer_row, keys)
+            return
+
+        layout_row: TRow | None = None
+        left_cols: list[tuple[str, str]] = []
+        right_cols: list[tuple[str, str]] = []
+        if a_outer:
+            single_right: TRow | None = None
+            for row_a in rows_a:
+                if layout_row is None or row_a.keys() != layout_row.keys():
+                    layout_row = row_a
+                    left_cols, right_cols = self.get_layout(row_a, first_inner, keys)
+                    if len(inner_rows) == 1:
+                        # broadcast of a single row, e.g. global aggregate joined back by empty keys
+                        single_right = {dst: first_inner[src] for src, dst in right_cols}
+                left = {key: row_a[key] for key in keys}
+                for src, dst in left_cols:
+                    left[dst] = row_a[src]
+                if single_right is not None:
+                    left.update(single_right)
+                    yield left
+                    continue
+                for row_b in inner_rows:
+                    ans = left.copy()
+                    for src, dst in right_cols:
+                        ans[dst] = row_b[src]
+                    yield ans
+        else:
+            for row_b in rows_b:
+                if layout_row is None or row_b.keys() != layout_row.keys():
+                    layout_row = row_b
+                    left_cols, right_cols = self.get_layout(first_inner, row_b, keys)
+                right = {dst: row_b[src] for src, dst in right_cols}
+                for row_a in inner_rows:
+                    ans = {key: row_a[key] for key in keys}
+                    for src, dst in left_cols:
+                        ans[dst] = row_a[src]
+                    ans.update(right)
+                    yield ans
+
     @abstractmethod
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
         """
@@ -133,15 +458,18 @@ class Join(Operation):
     def __init__(self, joiner: Joiner, keys: tp.Sequence[str]):
         self.keys = keys
         self.joiner = joiner
+        self._key_fn = key_getter(keys)
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        grouped_rows_a = groupby(rows, key=lambda x: [x[key] for key in self.keys])
-        grouped_rows_b = groupby(args[0], key=lambda x: [x[key] for key in self.keys])
+        grouped_rows_a = groupby(rows, key=self._key_fn)
+        grouped_rows_b = groupby(args[0], key=self._key_fn)
 
+        key_a: tp.Any
+        key_b: tp.Any
         (key_a, group_a) = next(grouped_rows_a, (None, None))
         (key_b, group_b) = next(grouped_rows_b, (None, None))
 
-        while key_a is not None and key_b is not None and group_a is not None and group_b is not None:
+        while group_a is not None and group_b is not None:
             if key_a == key_b:
                 for el in self.joiner(self.keys, group_a, group_b):
                     yield el
@@ -173,14 +501,25 @@ class Join(Operation):
             (key_b, group_b) = next(grouped_rows_b, (None, None))
 
 
+class HashJoin(Operation):
+    """Join of unsorted streams: joiner is given whole left stream and whole right stream"""
+
+    def __init__(self, joiner: 'HashInnerJoiner', keys: tp.Sequence[str]):
+        self.keys = keys
+        self.joiner = joiner
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        yield from self.joiner(self.keys, rows, args[0])
+
+
 # Dummy operators
 
 
-class DummyMapper(Mapper):
+class DummyMapper(RowMapper):
     """Yield exactly the row passed"""
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield row
+    def apply(self, row: TRow) -> TRow | None:
+        return row
 
 
 class FirstReducer(Reducer):
@@ -195,7 +534,7 @@ class FirstReducer(Reducer):
 # Mappers
 
 
-class FilterPunctuation(Mapper):
+class FilterPunctuation(RowMapper):
     """Left only non-punctuation symbols"""
 
     def __init__(self, column: str):
@@ -204,12 +543,12 @@ class FilterPunctuation(Mapper):
         """
         self.column = column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self.column] = remove_punctuation(row[self.column])
-        yield row
+        return row
 
 
-class LowerCase(Mapper):
+class LowerCase(RowMapper):
     """Replace column value with value in lower case"""
 
     def __init__(self, column: str):
@@ -222,9 +561,9 @@ class LowerCase(Mapper):
     def _lower_case(txt: str) -> str:
         return txt.lower()
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self.column] = self._lower_case(row[self.column])
-        yield row
+        return row
 
 
 class Split(Mapper):
@@ -239,14 +578,29 @@ class Split(Mapper):
         self.separator = separator
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        values = row[self.column].split()
-        for value in values:
-            new_row = row.copy()
-            new_row[self.column] = value
-            yield new_row
+        base = {key: value for key, value in row.items() if key != self.column}
+        for value in row[self.column].split():
+            yield {**base, self.column: value}
 
 
-class Product(Mapper):
+class TokenizeText(Mapper):
+    """Split text column on lower case words without punctuation,
+    fused version of FilterPunctuation, LowerCase and Split"""
+
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name of column to tokenize
+        """
+        self.column = column
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        text = tokenize_text(row[self.column])
+        base = {key: value for key, value in row.items() if key != self.column}
+        for token in text.split():
+            yield {**base, self.column: token}
+
+
+class Product(RowMapper):
     """Calculates product of multiple columns"""
 
     def __init__(self, columns: tp.Sequence[str], result_column: str = 'product') -> None:
@@ -257,14 +611,14 @@ class Product(Mapper):
         self.columns = columns
         self.result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self.result_column] = 1
         for column in self.columns:
             row[self.result_column] *= row[column]
-        yield row
+        return row
 
 
-class Filter(Mapper):
+class Filter(RowMapper):
     """Remove records that don't satisfy some condition"""
 
     def __init__(self, condition: tp.Callable[[TRow], bool]) -> None:
@@ -273,50 +627,134 @@ class Filter(Mapper):
         """
         self.condition = condition
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         if self.condition(row):
-            yield row
+            return row
+        return None
+
+
+class FilterMinLen(RowMapper):
+    """Remove records with value of column shorter than min_len, Filter without predicate call per row"""
+
+    def __init__(self, column: str, min_len: int) -> None:
+        """
+        :param column: name of column with sized values, e.g. words
+        :param min_len: minimal length of value to keep record
+        """
+        self.column = column
+        self.min_len = min_len
+
+    def apply(self, row: TRow) -> TRow | None:
+        if len(row[self.column]) >= self.min_len:
+            return row
+        return None
+
+
+class FilterMinValue(RowMapper):
+    """Remove records with value of column less than min_value, Filter without predicate call per row"""
+
+    def __init__(self, column: str, min_value: tp.Any) -> None:
+        """
+        :param column: name of column
+        :param min_value: minimal value to keep record
+        """
+        self.column = column
+        self.min_value = min_value
+
+    def apply(self, row: TRow) -> TRow | None:
+        if row[self.column] >= self.min_value:
+            return row
+        return None
 
 
-class Project(Mapper):
+class Project(RowMapper):
     """Leave only mentioned columns"""
 
     def __init__(self, columns: tp.Sequence[str]) -> None:
         """
         :param columns: names of columns
         """
-        self.columns = columns
+        self.columns = tuple(columns)
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield {key: value for key, value in row.items() if key in self.columns}
+    def apply(self, row: TRow) -> TRow | None:
+        return {key: row[key] for key in self.columns if key in row}
 
 
-class IDF(Mapper):
-    def __init__(self, columns: tp.Sequence[str], result_col: str = 'idf') -> None:
+class LogRatio(BatchMapper):
+    """
+    Natural logarithm of ratio of two columns, like np.log: zero ratio gives -inf and negative one gives nan;
+    zero denominator raises ZeroDivisionError
+    """
+
+    def __init__(self, columns: tp.Sequence[str], result_col: str = 'log_ratio') -> None:
         """
-        :param columns: names of columns
-        :param result_col: name of idf column
+        :param columns: names of numerator and denominator columns
+        :param result_col: name of result column
         """
         self.columns = columns
         self.result_col = result_col
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        row[self.result_col] = np.log(row[self.columns[0]] / row[self.columns[1]])
-        yield row
+    def apply(self, row: TRow) -> TRow | None:
+        ratio = row[self.columns[0]] / row[self.columns[1]]
+        if ratio > 0:
+            row[self.result_col] = log(ratio)
+        else:
+            row[self.result_col] = -math.inf if ratio == 0 else math.nan
+        return row
 
+    def apply_batch(self, rows: list[TRow]) -> None:
+        denominators = column_array(rows, self.columns[1])
+        if not denominators.all():
+            raise ZeroDivisionError('division by zero')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.log(column_array(rows, self.columns[0]) / denominators)
+        for row, value in zip(rows, values.tolist()):
+            row[self.result_col] = value
 
-class PMI(Mapper):
-    def __init__(self, columns: tp.Sequence[str], result_col: str = 'pmi') -> None:
+
+class IDF(LogRatio):
+    """
+    Numerator (number of documents) is the same for every row after broadcast join,
+    so its logarithm is computed once and only log of denominator is taken per row
+    """
+
+    def __init__(self, columns: tp.Sequence[str], result_col: str = 'idf') -> None:
         """
         :param columns: names of columns
         :param result_col: name of idf column
         """
-        self.columns = columns
-        self.result_col = result_col
-
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        row[self.result_col] = np.log(row[self.columns[0]] / row[self.columns[1]])
-        yield row
+        super().__init__(columns, result_col)
+        self._numerator: tp.Any = None
+        self._log_numerator = 0.0
+
+    def apply(self, row: TRow) -> TRow | None:
+        numerator = row[self.columns[0]]
+        denominator = row[self.columns[1]]
+        if numerator <= 0 or denominator <= 0:
+            return super().apply(row)
+        if numerator != self._numerator:
+            self._numerator, self._log_numerator = numerator, log(numerator)
+        row[self.result_col] = self._log_numerator - log(denominator)
+        return row
+
+    def apply_batch(self, rows: list[TRow]) -> None:
+        numerators = column_array(rows, self.columns[0])
+        denominators = column_array(rows, self.columns[1])
+        if not len(rows) or numerators[0] <= 0 or (numerators != numerators[0]).any() or (denominators <= 0).any():
+            super().apply_batch(rows)
+            return
+        values = log(numerators[0]) - np.log(denominators)
+        for row, value in zip(rows, values.tolist()):
+            row[self.result_col] = value
+
+
+class PMI(LogRatio):
+    def __init__(self, columns: tp.Sequence[str], result_col: str = 'pmi') -> None:
+        """
+        :param columns: names of columns
+        :param result_col: name of pmi column
+        """
+        super().__init__(columns, result_col)
 
 
 class Reveal(Mapper):
@@ -327,25 +765,24 @@ class Reveal(Mapper):
         self.column_to_reveal = column
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        times = row[self.column_to_reveal]
-        del row[self.column_to_reveal]
+        times = row.pop(self.column_to_reveal)
         for _ in range(times):
             yield row
 
 
-class Inverse(Mapper):
+class Inverse(RowMapper):
     def __init__(self, column: str) -> None:
         """
         :param column: name of column to reveal
         """
         self.column_to_inverse = column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self.column_to_inverse] = -row[self.column_to_inverse]
-        yield row
+        return row
 
 
-class GetDuration(Mapper):
+class GetDuration(RowMapper):
     def __init__(self, start_col: str, leave_col: str, res_col_name: str = 'duration') -> None:
         """
         :param start_col: name of column with start time
@@ -356,16 +793,13 @@ class GetDuration(Mapper):
         self.leave_col = leave_col
         self.res_col_name = res_col_name
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        date_format = "%Y%m%dT%H%M%S.%f"
-        start = datetime.strptime(row[self.start_col], date_format)
-        leave = datetime.strptime(row[self.leave_col], date_format)
-        time_delta = leave - start
-        row[self.res_col_name] = time_delta.total_seconds() / 3600
-        yield row
+    def apply(self, row: TRow) -> TRow | None:
+        duration_us = timestamp_to_us(row[self.leave_col]) - timestamp_to_us(row[self.start_col])
+        row[self.res_col_name] = duration_us / 3_600_000_000
+        return row
 
 
-class GetWeekdayAndHour(Mapper):
+class GetWeekdayAndHour(RowMapper):
     def __init__(self, enter_time_col: str, weekday_res_col: str, hour_res_col: str) -> None:
         """
         :param enter_time_col: name of column with start time
@@ -376,15 +810,41 @@ class GetWeekdayAndHour(Mapper):
         self.weekday_res_col = weekday_res_col
         self.hour_res_col = hour_res_col
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        date_format = "%Y%m%dT%H%M%S.%f"
-        dt_object = datetime.strptime(row[self.enter_time_col], date_format)
-        row[self.weekday_res_col] = dt_object.strftime("%a")
-        row[self.hour_res_col] = dt_object.hour
-        yield row
+    def apply(self, row: TRow) -> TRow | None:
+        enter_time = row[self.enter_time_col]
+        timestamp_to_us(enter_time)  # validates the whole timestamp, prefix lookup below is cached
+        row[self.weekday_res_col], row[self.hour_res_col] = weekday_and_hour(enter_time[:11])
+        return row
+
+
+class ParseTripTimes(RowMapper):
+    """Calculate duration, weekday and hour of the trip parsing each time once,
+    fused version of GetDuration and GetWeekdayAndHour"""
 
+    def __init__(self, enter_time_col: str, leave_time_col: str, duration_res_col: str = 'duration',
+                 weekday_res_col: str = 'weekday', hour_res_col: str = 'hour') -> None:
+        """
+        :param enter_time_col: name of column with start time
+        :param leave_time_col: name of column with leave time
+        :param duration_res_col: name of column with result duration in hours
+        :param weekday_res_col: name of column with weekday of the trip
+        :param hour_res_col: name of column with hour of the trip
+        """
+        self.enter_time_col = enter_time_col
+        self.leave_time_col = leave_time_col
+        self.duration_res_col = duration_res_col
+        self.weekday_res_col = weekday_res_col
+        self.hour_res_col = hour_res_col
 
-class GetHaversineDist(Mapper):
+    def apply(self, row: TRow) -> TRow | None:
+        enter_time = row[self.enter_time_col]
+        enter_us = timestamp_to_us(enter_time)
+        row[self.duration_res_col] = (timestamp_to_us(row[self.leave_time_col]) - enter_us) / 3_600_000_000
+        row[self.weekday_res_col], row[self.hour_res_col] = weekday_and_hour(enter_time[:11])
+        return row
+
+
+class GetHaversineDist(BatchMapper):
     def __init__(self, start: str, end: str, res_col_name: str = 'distance') -> None:
         """
                 :param start: name of column with start coordinates
@@ -395,19 +855,27 @@ class GetHaversineDist(Mapper):
         self.end = end
         self.res_col_name = res_col_name
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         lng1, lat1 = row[self.start]
         lng2, lat2 = row[self.end]
-        lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
-        radius = 6373  # in km
-        lat = lat2 - lat1
-        lng = lng2 - lng1
-        d = np.sin(lat * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(lng * 0.5) ** 2
-        row[self.res_col_name] = 2 * radius * np.arcsin(np.sqrt(d))
-        yield row
-
-
-class GetAverageSpeed(Mapper):
+        lat1 = radians(lat1)
+        lat2 = radians(lat2)
+        sin_lat = sin((lat2 - lat1) * 0.5)
+        sin_lng = sin((radians(lng2) - radians(lng1)) * 0.5)
+        d = sin_lat * sin_lat + cos(lat1) * cos(lat2) * (sin_lng * sin_lng)
+        row[self.res_col_name] = _EARTH_DIAMETER * asin(sqrt(d))
+        return row
+
+    def apply_batch(self, rows: list[TRow]) -> None:
+        start = np.array([row[self.start] for row in rows], dtype=np.float64)
+        end = np.array([row[self.end] for row in rows], dtype=np.float64)
+        distances = np.empty(len(rows), dtype=np.float64)
+        haversine_batch(start[:, 0], start[:, 1], end[:, 0], end[:, 1], distances)
+        for row, value in zip(rows, distances.tolist()):
+            row[self.res_col_name] = value
+
+
+class GetAverageSpeed(RowMapper):
     def __init__(self, dist: str, duration: str, res_col_name: str = 'speed') -> None:
         """
         :param dist: name of column with total distances of that time
@@ -418,9 +886,9 @@ class GetAverageSpeed(Mapper):
         self.duration = duration
         self.res_col_name = res_col_name
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self.res_col_name] = row[self.dist] / row[self.duration]
-        yield row
+        return row
 
 
 # Reducers
@@ -438,15 +906,21 @@ class TopN(Reducer):
         self.n = n
 
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        heap: list[tuple[tp.Any, list[tuple[str, tp.Any]]]] = []
-        for row in rows:
-            values = [(key, value) for key, value in row.items()]
-            heapq.heappush(heap, (row[self.column_max], values))
-            if len(heap) > self.n:
-                heapq.heappop(heap)
-
-        for key, values in heap:
-            yield {key: value for key, value in values}
+        column, n = self.column_max, self.n
+        if n <= 0:
+            return
+        # counter breaks ties between equal scores so that rows are never compared,
+        # of rows with equal scores the earliest ones are kept
+        heap: list[tuple[tp.Any, int, TRow]] = []
+        for counter, row in enumerate(rows):
+            score = row[column]
+            if len(heap) < n:
+                heapq.heappush(heap, (score, counter, row))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, counter, row))
+
+        for _, _, row in heap:
+            yield row
 
 
 class TermFrequency(Reducer):
@@ -461,19 +935,20 @@ class TermFrequency(Reducer):
         self.result_column = result_column
 
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        words_count: dict[str, int] = defaultdict(int)
-        keys: dict[str, tp.Any] = {}
-        summ = 0
-
-        for row in rows:
-            if not keys:
-                keys = {key: row[key] for key in group_key}
-            words_count[row[self.words_column]] += 1
-            summ += 1
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        keys = {key: first[key] for key in group_key}
+        words_column = self.words_column
+
+        # Counter.update counts an iterable in C
+        words_count = Counter({first[words_column]: 1})
+        words_count.update(map(itemgetter(words_column), rows))
+        summ = sum(words_count.values())
 
         for word, count in words_count.items():
-            ans = {**keys, self.words_column: word, self.result_column: count / summ}
-            yield ans
+            yield {**keys, words_column: word, self.result_column: count / summ}
 
 
 class Count(Reducer):
@@ -539,11 +1014,22 @@ class InnerJoiner(Joiner):
     """Join with inner strategy"""
 
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        list_rows_b = list(rows_b)
+        yield from self.cross_join(keys, rows_a, rows_b)
+
+
+class HashInnerJoiner(Joiner):
+    """Join with inner strategy of unsorted tables: right table is indexed by keys in memory
+    and left one is streamed, so right table should be the small one"""
+
+    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
+        key_fn = key_getter(keys)
+        index: dict[tp.Any, list[TRow]] = defaultdict(list)
+        for row_b in rows_b:
+            index[key_fn(row_b)].append(row_b)
+        get_ans = self.get_ans
         for row_a in rows_a:
-            for row_b in list_rows_b:
-                ans = self.get_ans(row_a, row_b, keys)
-                yield ans
+            for row_b in index.get(key_fn(row_a), ()):
+                yield get_ans(row_a, row_b, keys)
 
 
 class OuterJoiner(Joiner):
@@ -559,10 +1045,7 @@ class OuterJoiner(Joiner):
             for el in list_rows_b:
                 yield el
         else:
-            for row_a in list_rows_a:
-                for row_b in list_rows_b:
-                    ans = self.get_ans(row_a, row_b, keys)
-                    yield ans
+            yield from self.cross_join(keys, list_rows_a, list_rows_b)
 
 
 class LeftJoiner(Joiner):
@@ -574,10 +1057,7 @@ class LeftJoiner(Joiner):
             for el in rows_a:
                 yield el
         else:
-            for row_a in rows_a:
-                for row_b in list_rows_b:
-                    ans = self.get_ans(row_a, row_b, keys)
-                    yield ans
+            yield from self.cross_join(keys, rows_a, list_rows_b)
 
 
 class RightJoiner(Joiner):
@@ -589,7 +1069,4 @@ class RightJoiner(Joiner):
             for el in rows_b:
                 yield el
         else:
-            for row_b in rows_b:
-                for row_a in list_rows_a:
-                    ans = self.get_ans(row_a, row_b, keys)
-                    yield ans
+            yield from self.cross_join(keys, list_rows_a, rows_b, a_outer=False)
@@ -1,7 +1,7 @@
-import json
 import click
 import os
 from compgraph.algorithms import inverted_index_graph
+from compgraph.json_io import write_rows
 
 
 @click.command()
@@ -14,8 +14,7 @@ def tf_idf(input_filepath: str, output_filepath: str) -> None:
     graph = inverted_index_graph(input_filepath, file=True)
 
     result = graph.run()
-    with open(output_filepath, "w") as out:
-        json.dump((list(result)), out)
+    write_rows(result, output_filepath)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
-import json
 import click
 from compgraph.algorithms import pmi_graph
+from compgraph.json_io import write_rows
 
 
 @click.command()
@@ -10,8 +10,7 @@ def pmi(input_filepath: str, output_filepath: str) -> None:
     graph = pmi_graph(name=input_filepath, file=True)
 
     result = graph.run()
-    with open(output_filepath, "w") as out:
-        json.dump((list(result)), out)
+    write_rows(result, output_filepath)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
-import json
 import click
 from compgraph.algorithms import word_count_graph
+from compgraph.json_io import write_rows
 
 
 @click.command()
@@ -10,8 +10,7 @@ def word_count(input_filepath: str, output_filepath: str) -> None:
     graph = word_count_graph(name=input_filepath, text_column='text', count_column='count', file=True)
 
     result = graph.run()
-    with open(output_filepath, "w") as out:
-        json.dump((list(result)), out)
+    write_rows(result, output_filepath)
 
 
 if __name__ == '__main__':
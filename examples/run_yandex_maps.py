@@ -1,18 +1,19 @@
-import json
 import click
 from compgraph.algorithms import yandex_maps_graph
+from compgraph.json_io import write_rows
 
 
 @click.command()
 @click.argument('first_input_filepath', nargs=1)
 @click.argument('second_input_filepath', nargs=1)
 @click.argument('output_filepath', nargs=1)
-def yandex_maps(first_input_filepath: str, second_input_filepath: str, output_filepath: str) -> None:
-    graph = yandex_maps_graph(name1=first_input_filepath, name2=second_input_filepath, file=True)
+@click.option('--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of processes computing times and distances')
+def yandex_maps(first_input_filepath: str, second_input_filepath: str, output_filepath: str, workers: int) -> None:
+    graph = yandex_maps_graph(name1=first_input_filepath, name2=second_input_filepath, file=True, workers=workers)
 
     result = graph.run()
-    with open(output_filepath, "w") as out:
-        json.dump((list(result)), out)
+    write_rows(result, output_filepath)
 
 
 if __name__ == '__main__':
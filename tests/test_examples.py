@@ -1,10 +1,14 @@
 import typing as tp
 import examples
+import math
 import json
 
+import pytest
 from pytest import approx
 from click.testing import CliRunner
 
+from compgraph import json_io
+
 
 class _Key:
     def __init__(self, *args: str) -> None:
@@ -14,6 +18,29 @@ class _Key:
         return tuple(str(d.get(key)) for key in self._items)
 
 
+def _read_rows(filepath: tp.Any) -> tp.Any:
+    with open(filepath, 'r') as fp:
+        return [json.loads(line) for line in fp]
+
+
+@pytest.mark.parametrize('dumps_line', [json_io.json_dumps_line, json_io.dumps_line])
+def test_dumps_line(dumps_line: tp.Callable[[tp.Any], bytes]) -> None:
+    assert json.loads(dumps_line({'a': None, 'b': [1.5, 'x']})) == {'a': None, 'b': [1.5, 'x']}
+    for value in math.nan, math.inf, -math.inf:
+        with pytest.raises(ValueError):
+            dumps_line({'a': 1, 'b': value})
+        with pytest.raises(ValueError):
+            dumps_line({'a': None, 'b': [0.0, value]})
+
+
+@pytest.mark.parametrize('workers', ['0', '-2'])
+def test_yandex_maps_invalid_workers(tmp_path: tp.Any, workers: str) -> None:
+    paths = [str(tmp_path / name) for name in ('times.txt', 'lengths.txt', 'output.txt')]
+    result = CliRunner().invoke(examples.yandex_maps, [*paths, '--workers', workers])
+    assert result.exit_code == 2
+    assert 'Invalid value for \'--workers\'' in result.output
+
+
 def test_word_count(tmp_path: tp.Any) -> None:
     runner = CliRunner()
     input_file = tmp_path / 'input1.txt'
@@ -29,8 +56,7 @@ def test_word_count(tmp_path: tp.Any) -> None:
     result = runner.invoke(examples.word_count, [str(input_file), str(output_file)])
     assert result.exit_code == 0
 
-    with open(output_file, 'r') as fp:
-        result = json.load(fp)
+    result = _read_rows(output_file)
 
     expected = [
         {'count': 1, 'text': 'hell'},
@@ -62,8 +88,7 @@ def test_pmi(tmp_path: tp.Any) -> None:
     result = runner.invoke(examples.pmi, [str(input_file), str(output_file)])
     assert result.exit_code == 0
 
-    with open(output_file, 'r') as fp:
-        result = json.load(fp)
+    result = _read_rows(output_file)
 
     expected = [
         {'doc_id': 3, 'text': 'little', 'pmi': approx(0.9555, 0.001)},
@@ -105,8 +130,7 @@ def test_tf_idf(tmp_path: tp.Any) -> None:
 
     assert result.exit_code == 0, f"Script execution failed: {result.output}"
 
-    with open(output_file, 'r') as fp:
-        result = json.load(fp)
+    result = _read_rows(output_file)
 
     expected = [
         {'doc_id': 1, 'text': 'hello', 'tf_idf': approx(0.1351, 0.001)},
@@ -130,7 +154,8 @@ def test_tf_idf(tmp_path: tp.Any) -> None:
     assert sorted(result, key=key_func) == expected
 
 
-def test_yandex_maps(tmp_path: tp.Any) -> None:
+@pytest.mark.parametrize('workers', [1, 2])
+def test_yandex_maps(tmp_path: tp.Any, workers: int) -> None:
     runner = CliRunner()
     first_input_file = tmp_path / 'input4.txt'
     second_input_file = tmp_path / 'input5.txt'
@@ -178,11 +203,10 @@ def test_yandex_maps(tmp_path: tp.Any) -> None:
         json.dump(lengths, fp)
 
     result = runner.invoke(examples.yandex_maps,
-                           [str(first_input_file), str(second_input_file), str(output_file)])
+                           [str(first_input_file), str(second_input_file), str(output_file), '--workers', str(workers)])
     assert result.exit_code == 0
 
-    with open(output_file, 'r') as fp:
-        result = json.load(fp)
+    result = _read_rows(output_file)
 
     expected = [
         {'weekday': 'Fri', 'hour': 8, 'speed': approx(62.2322, 0.001)},
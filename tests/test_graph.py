@@ -1,9 +1,13 @@
 from itertools import islice, cycle
+import json
+import multiprocessing
+import time
+import typing as tp
 from operator import itemgetter
 import compgraph.operations as operations
 from compgraph.algorithms import Graph
 
-from pytest import approx
+from pytest import approx, raises
 
 from compgraph import algorithms
 
@@ -94,6 +98,219 @@ def test_sort() -> None:
     assert result == expected
 
 
+def test_hash_reduce() -> None:
+    data = [
+        {'test_id': 2, 'score': 5},
+        {'test_id': 1, 'score': 3},
+        {'test_id': 2, 'score': 1},
+        {'test_id': 1, 'score': 4},
+        {'test_id': 3, 'score': 2}
+    ]
+
+    graph = Graph.graph_from_iter('data')
+    sum_graph = graph.hash_reduce(operations.Sum('score'), ['test_id'])
+    first_graph = graph.hash_reduce(operations.FirstReducer(), ['test_id'])
+    count_graph = graph.hash_reduce(operations.Count('count'), [])
+
+    assert list(sum_graph.run(data=lambda: iter(data))) == [
+        {'test_id': 2, 'score': 6},
+        {'test_id': 1, 'score': 7},
+        {'test_id': 3, 'score': 2}
+    ]
+    assert list(first_graph.run(data=lambda: iter(data))) == [
+        {'test_id': 2, 'score': 5},
+        {'test_id': 1, 'score': 3},
+        {'test_id': 3, 'score': 2}
+    ]
+    assert list(count_graph.run(data=lambda: iter(data))) == [{'count': 5}]
+    assert list(count_graph.run(data=lambda: iter([]))) == []
+
+
+class _MaxScore(operations.Sum):
+    def __call__(self, group_key: tuple[str, ...], rows: operations.TRowsIterable) -> operations.TRowsGenerator:
+        rows = list(rows)
+        yield {**{key: rows[0][key] for key in group_key}, self.column: max(row[self.column] for row in rows)}
+
+
+def test_hash_reduce_reducer_subclass() -> None:
+    data = [
+        {'test_id': 2, 'score': 5},
+        {'test_id': 1, 'score': 3},
+        {'test_id': 2, 'score': 1}
+    ]
+
+    graph = Graph.graph_from_iter('data').hash_reduce(_MaxScore('score'), ['test_id'])
+    assert list(graph.run(data=lambda: iter(data))) == [
+        {'test_id': 2, 'score': 5},
+        {'test_id': 1, 'score': 3}
+    ]
+
+
+def test_pre_aggregate_count() -> None:
+    data = [
+        {'doc_id': 1, 'text': 'a'},
+        {'doc_id': 2, 'text': 'b'},
+        {'doc_id': 3, 'text': 'a'},
+        {'doc_id': 4, 'text': 'c'},
+        {'doc_id': 5, 'text': 'a'}
+    ]
+
+    expected = [
+        {'text': 'a', 'count': 3},
+        {'text': 'b', 'count': 1},
+        {'text': 'c', 'count': 1}
+    ]
+
+    graph = Graph.graph_from_iter('data') \
+        .pre_aggregate_count(['text'], 'count', max_entries=2) \
+        .sort(['text']) \
+        .reduce(operations.Sum('count'), ['text'])
+    result = list(graph.run(data=lambda: iter(data)))
+    assert result == expected
+
+
+def test_fast_sort() -> None:
+    data: list[operations.TRow] = [
+        {'count': 3, 'text': 'c'},
+        {'count': 1, 'text': 'b'},
+        {'count': 3, 'text': 'a'},
+        {'count': 1, 'text': 'a'},
+        {'count': 2, 'text': 'd'}
+    ]
+
+    expected: list[operations.TRow] = [
+        {'count': 1, 'text': 'a'},
+        {'count': 1, 'text': 'b'},
+        {'count': 2, 'text': 'd'},
+        {'count': 3, 'text': 'a'},
+        {'count': 3, 'text': 'c'}
+    ]
+
+    graph = Graph.graph_from_iter('data').fast_sort(['count', 'text'])
+    assert list(graph.run(data=lambda: iter(data))) == expected
+
+    float_data = [{**row, 'count': row['count'] / 2} for row in data]
+    float_expected = [{**row, 'count': row['count'] / 2} for row in expected]
+    assert list(graph.run(data=lambda: iter(float_data))) == float_expected
+
+
+def test_sort_descending_key() -> None:
+    data: list[operations.TRow] = [
+        {'doc': 2, 'score': 0.5, 'text': 'a'},
+        {'doc': 1, 'score': 0.1, 'text': 'b'},
+        {'doc': 1, 'score': 0.7, 'text': 'c'},
+        {'doc': 2, 'score': 0.9, 'text': 'd'},
+        {'doc': 1, 'score': 0.7, 'text': 'e'}
+    ]
+
+    expected: list[operations.TRow] = [
+        {'doc': 1, 'score': 0.7, 'text': 'c'},
+        {'doc': 1, 'score': 0.7, 'text': 'e'},
+        {'doc': 1, 'score': 0.1, 'text': 'b'},
+        {'doc': 2, 'score': 0.9, 'text': 'd'},
+        {'doc': 2, 'score': 0.5, 'text': 'a'}
+    ]
+
+    graph = Graph.graph_from_iter('data').sort(['doc', ('score', 'desc'), ('text', 'asc')])
+    assert list(graph.run(data=lambda: iter(data))) == expected
+
+    with raises(ValueError):
+        Graph.graph_from_iter('data').sort([('score', 'down')])
+
+
+def test_read_parses_line_once(tmp_path: tp.Any) -> None:
+    input_file = tmp_path / 'input.txt'
+    input_file.write_text('[{"a": 1}, {"a": 2}]\n{"a": 3}\n')
+    calls = []
+
+    def parser(line: str) -> tp.Any:
+        calls.append(line)
+        return json.loads(line)
+
+    graph = Graph.graph_from_file(str(input_file), parser)
+    assert list(graph.run()) == [{'a': 1}, {'a': 2}, {'a': 3}]
+    assert len(calls) == 2
+
+
+def test_hash_join() -> None:
+    left: list[operations.TRow] = [
+        {'text': 'b', 'doc': 1, 'score': 1},
+        {'text': 'a', 'doc': 2, 'score': 2},
+        {'text': 'c', 'doc': 3, 'score': 3},
+        {'text': 'b', 'doc': 4, 'score': 4}
+    ]
+    right: list[operations.TRow] = [
+        {'text': 'b', 'score': 10},
+        {'text': 'a', 'score': 20},
+        {'text': 'b', 'score': 30}
+    ]
+
+    left_graph = Graph.graph_from_iter('left')
+    right_graph = Graph.graph_from_iter('right')
+    hashed = left_graph.hash_join(operations.HashInnerJoiner(), right_graph, ['text'])
+    merged = left_graph.sort(['text']).join(operations.InnerJoiner(), right_graph.sort(['text']), ['text'])
+
+    result = list(hashed.run(left=lambda: iter(left), right=lambda: iter(right)))
+    expected = list(merged.run(left=lambda: iter(left), right=lambda: iter(right)))
+    key = itemgetter('text', 'doc', 'score_2')
+    assert len(result) == 5
+    assert sorted(result, key=key) == sorted(expected, key=key)
+
+
+def test_run_parallel() -> None:
+    rows = [
+        {'doc_id': 1, 'text': 'hello, little world'},
+        {'doc_id': 2, 'text': 'little'},
+        {'doc_id': 3, 'text': 'little little little'},
+        {'doc_id': 4, 'text': 'little? hello little world'},
+        {'doc_id': 5, 'text': 'HELLO HELLO! WORLD...'},
+        {'doc_id': 6, 'text': 'world? world... world!!! WORLD!!! HELLO!!!'}
+    ]
+
+    for graph in (algorithms.inverted_index_graph('texts'), algorithms.pmi_graph('texts'),
+                  algorithms.word_count_graph('texts')):
+        expected = list(graph.run(texts=lambda: iter(rows)))
+        assert list(graph.run_parallel(texts=lambda: iter(rows))) == expected
+        assert list(graph.run_parallel(n_workers=1, texts=lambda: iter(rows))) == expected
+
+
+def _slow_rows() -> tp.Iterator[operations.TRow]:
+    for i in range(100):
+        time.sleep(0.1)
+        yield {'key': i}
+
+
+def _failing_rows() -> tp.Iterator[operations.TRow]:
+    raise ValueError('broken source')
+    yield
+
+
+def test_run_parallel_failed_branch() -> None:
+    graph = Graph.graph_from_iter('slow') \
+        .join(operations.InnerJoiner(), Graph.graph_from_iter('failing'), ['key'])
+
+    started = time.monotonic()
+    with raises(RuntimeError):
+        list(graph.run_parallel(n_workers=2, slow=_slow_rows, failing=_failing_rows))
+    assert time.monotonic() - started < 5
+    assert not multiprocessing.active_children()
+
+    with raises(ValueError):
+        list(graph.run_parallel(n_workers=0, slow=_slow_rows, failing=_failing_rows))
+
+
+def test_parallel_map() -> None:
+    data = [{'doc_id': i, 'text': f'Hello, World {i}!'} for i in range(25)]
+
+    graph = Graph.graph_from_iter('data').map(operations.TokenizeText('text'))
+    parallel = Graph.graph_from_iter('data').parallel_map(operations.TokenizeText('text'), n_workers=2, chunk_size=3)
+    assert list(parallel.run(data=lambda: iter(data))) == list(graph.run(data=lambda: iter(data)))
+
+    for n_workers in 0, -1:
+        with raises(ValueError):
+            Graph.graph_from_iter('data').parallel_map(operations.TokenizeText('text'), n_workers=n_workers)
+
+
 # Tests multiple call of graphs
 
 
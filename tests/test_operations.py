@@ -1,11 +1,13 @@
-import copy
 import dataclasses
+from datetime import datetime, timedelta
+import math
 import typing as tp
 
+import numpy as np
 import pytest
 from pytest import approx
 
-from compgraph import operations as ops
+from compgraph import _kernels, operations as ops
 
 
 class _Key:
@@ -13,7 +15,11 @@ class _Key:
         self._items = args
 
     def __call__(self, d: tp.Mapping[str, tp.Any]) -> tuple[str, ...]:
-        return tuple(str(d.get(key)) for key in self._items)
+        return tuple(map(str, map(d.get, self._items)))
+
+
+def _clone(row: ops.TRow) -> ops.TRow:
+    return {key: list(value) if isinstance(value, list) else value for key, value in row.items()}
 
 
 @dataclasses.dataclass
@@ -107,6 +113,21 @@ MAP_CASES = [
         ],
         cmp_keys=('weekday', 'hour')
     ),
+    MapCase(
+        mapper=ops.ParseTripTimes(enter_time_col='enter', leave_time_col='leave', duration_res_col='duration',
+                                  weekday_res_col='week', hour_res_col='hour'),
+        data=[
+            {'enter': '20191022T131820.842000', 'leave': '20191022T131828.330000'},
+            {'enter': '20171022T235959.500000', 'leave': '20171023T000000.500000'}
+        ],
+        ground_truth=[
+            {'enter': '20191022T131820.842000', 'leave': '20191022T131828.330000',
+             'duration': approx(7.488 / 3600, 0.001), 'week': 'Tue', 'hour': 13},
+            {'enter': '20171022T235959.500000', 'leave': '20171023T000000.500000',
+             'duration': approx(1 / 3600, 0.001), 'week': 'Sun', 'hour': 23}
+        ],
+        cmp_keys=('enter',)
+    ),
     MapCase(
         mapper=ops.GetHaversineDist(start='start', end='end', res_col_name='distance'),
         data=[
@@ -124,6 +145,52 @@ MAP_CASES = [
         ],
         cmp_keys=('start', 'end', 'distance',)
     ),
+    MapCase(
+        mapper=ops.TokenizeText(column='text'),
+        data=[
+            {'doc_id': 1, 'text': 'Hello, my little WORLD!'},
+            {'doc_id': 2, 'text': 'Привет, МИР'}
+        ],
+        ground_truth=[
+            {'doc_id': 1, 'text': 'hello'},
+            {'doc_id': 1, 'text': 'little'},
+            {'doc_id': 1, 'text': 'my'},
+            {'doc_id': 1, 'text': 'world'},
+
+            {'doc_id': 2, 'text': 'мир'},
+            {'doc_id': 2, 'text': 'привет'}
+        ],
+        cmp_keys=('doc_id', 'text'),
+        mapper_ground_truth_items=(0, 1, 2, 3)
+    ),
+    MapCase(
+        mapper=ops.FilterMinLen(column='text', min_len=5),
+        data=[
+            {'doc_id': 1, 'text': 'hell'},
+            {'doc_id': 2, 'text': 'hello'},
+            {'doc_id': 3, 'text': 'little'}
+        ],
+        ground_truth=[
+            {'doc_id': 2, 'text': 'hello'},
+            {'doc_id': 3, 'text': 'little'}
+        ],
+        cmp_keys=('doc_id', 'text'),
+        mapper_ground_truth_items=tuple()
+    ),
+    MapCase(
+        mapper=ops.FilterMinValue(column='count', min_value=2),
+        data=[
+            {'doc_id': 1, 'count': 1},
+            {'doc_id': 2, 'count': 2},
+            {'doc_id': 3, 'count': 3}
+        ],
+        ground_truth=[
+            {'doc_id': 2, 'count': 2},
+            {'doc_id': 3, 'count': 3}
+        ],
+        cmp_keys=('doc_id', 'count'),
+        mapper_ground_truth_items=tuple()
+    ),
     MapCase(
         mapper=ops.GetAverageSpeed(dist='dist', duration='duration', res_col_name='speed'),
         data=[
@@ -143,8 +210,8 @@ MAP_CASES = [
 
 @pytest.mark.parametrize('case', MAP_CASES)
 def test_mapper(case: MapCase) -> None:
-    mapper_data_row = copy.deepcopy(case.data[case.mapper_item])
-    mapper_ground_truth_rows = [copy.deepcopy(case.ground_truth[i]) for i in case.mapper_ground_truth_items]
+    mapper_data_row = _clone(case.data[case.mapper_item])
+    mapper_ground_truth_rows = [_clone(case.ground_truth[i]) for i in case.mapper_ground_truth_items]
 
     key_func = _Key(*case.cmp_keys)
 
@@ -155,3 +222,149 @@ def test_mapper(case: MapCase) -> None:
     result = ops.Map(case.mapper)(iter(case.data))
     assert isinstance(result, tp.Iterator)
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+
+@pytest.mark.parametrize('case', [case for case in MAP_CASES if isinstance(case.mapper, ops.BatchMapper)])
+def test_batched_mapper(case: MapCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    result = ops.Map(case.mapper, batch_size=2)(map(_clone, case.data))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+
+class _DuplicateMapper(ops.Mapper):
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield row
+        yield row
+
+
+def test_generic_mapper() -> None:
+    data = [{'test_id': 1}, {'test_id': 2}]
+
+    result = ops.Map(_DuplicateMapper())(iter(data))
+    assert list(result) == [{'test_id': 1}, {'test_id': 1}, {'test_id': 2}, {'test_id': 2}]
+
+
+def test_log_ratio_edge_values() -> None:
+    mapper = ops.IDF(columns=['a', 'b'], result_col='log')
+    data = [{'a': 0, 'b': 2}, {'a': -1, 'b': 2}, {'a': 2, 'b': 2}]
+
+    scalar = [row['log'] for data_row in map(_clone, data) for row in mapper(data_row)]
+    batched = [row['log'] for row in ops.Map(mapper)(map(_clone, data))]
+    for result in scalar, batched:
+        assert result[0] == -math.inf
+        assert math.isnan(result[1])
+        assert result[2] == 0.0
+
+    with pytest.raises(ZeroDivisionError):
+        list(mapper({'a': 1, 'b': 0}))
+    with pytest.raises(ZeroDivisionError):
+        list(ops.Map(mapper)(iter([{'a': 1, 'b': 0}])))
+
+
+def test_idf_varying_numerator() -> None:
+    mapper = ops.IDF(columns=['a', 'b'], result_col='idf')
+    data = [{'a': 4, 'b': 2}, {'a': 4, 'b': 1}, {'a': 9, 'b': 3}, {'a': 4, 'b': 4}]
+    expected = [math.log(row['a'] / row['b']) for row in data]
+
+    scalar = [row['idf'] for data_row in map(_clone, data) for row in mapper(data_row)]
+    batched = [row['idf'] for row in ops.Map(mapper, batch_size=2)(map(_clone, data))]
+    assert scalar == approx(expected, rel=1e-12)
+    assert batched == approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('fraction', ['8', '84', '842', '8420', '84200', '842000'])
+def test_timestamp_fraction_digits(fraction: str) -> None:
+    timestamp = '20191022T131820.' + fraction
+    expected = datetime.strptime(timestamp, '%Y%m%dT%H%M%S.%f') - datetime(1, 1, 1)
+    assert ops.timestamp_to_us(timestamp) == expected // timedelta(microseconds=1)
+
+
+@pytest.mark.parametrize('timestamp', [
+    '20191022T131820.8420001', '20191022T131820', '20191022 131820.842000', '2019102T131820.842000',
+    '20191022T251820.842000', '20191022T131820.84200Z'
+])
+def test_malformed_timestamp(timestamp: str) -> None:
+    mapper = ops.GetDuration(start_col='start', leave_col='leave', res_col_name='duration')
+    with pytest.raises(ValueError):
+        list(mapper({'start': timestamp, 'leave': '20191022T131828.330000'}))
+
+
+@pytest.mark.parametrize('timestamp', [
+    '20191022 131820.842000', '20191022T251820.842000', '2019102T131820.842000',
+    '20191022T13garbage!!', '20191022T1318xx.842000', '20191022T131820.84200Z'
+])
+def test_malformed_weekday_and_hour(timestamp: str) -> None:
+    mapper = ops.GetWeekdayAndHour(enter_time_col='start', weekday_res_col='weekday', hour_res_col='hour')
+    with pytest.raises(ValueError):
+        list(mapper({'start': timestamp}))
+
+
+@pytest.mark.parametrize('n', [0, -1])
+def test_top_n_empty(n: int) -> None:
+    rows = [{'doc_id': 1, 'score': 1.0}, {'doc_id': 1, 'score': 2.0}]
+    assert list(ops.TopN('score', n)(('doc_id',), rows)) == []
+
+
+def test_top_n_ties_keep_earliest() -> None:
+    rows = [{'doc_id': 1, 'score': 1.0}, {'doc_id': 2, 'score': 1.0}, {'doc_id': 3, 'score': 1.0}]
+    result = ops.TopN('score', 2)((), rows)
+    assert sorted(row['doc_id'] for row in result) == [1, 2]
+
+
+def _items_key(row: ops.TRow) -> list[tuple[str, tp.Any]]:
+    return sorted(row.items())
+
+
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(), ops.LeftJoiner(), ops.RightJoiner(), ops.OuterJoiner()])
+def test_join_mixed_columns(joiner: ops.Joiner) -> None:
+    data_left = [{'k': 1, 'x': 1}, {'k': 1, 'y': 2}]
+
+    mixed_right = [{'k': 1, 'z': 3}, {'k': 1, 'w': 4}]
+    result = ops.Join(joiner, ['k'])(iter(data_left), iter(mixed_right))
+    assert sorted(result, key=_items_key) == sorted([
+        {'k': 1, 'x': 1, 'z': 3}, {'k': 1, 'x': 1, 'w': 4},
+        {'k': 1, 'y': 2, 'z': 3}, {'k': 1, 'y': 2, 'w': 4}
+    ], key=_items_key)
+
+    uniform_right = [{'k': 1, 'z': 3}, {'k': 1, 'z': 4}]
+    result = ops.Join(joiner, ['k'])(iter(data_left), iter(uniform_right))
+    assert sorted(result, key=_items_key) == sorted([
+        {'k': 1, 'x': 1, 'z': 3}, {'k': 1, 'x': 1, 'z': 4},
+        {'k': 1, 'y': 2, 'z': 3}, {'k': 1, 'y': 2, 'z': 4}
+    ], key=_items_key)
+
+
+def test_inner_join_empty_and_single_right() -> None:
+    data_left = [{'k': 1, 'x': 1}, {'k': 1, 'x': 2}, {'k': 2, 'x': 3}]
+
+    assert list(ops.InnerJoiner()([], iter(data_left), iter([]))) == []
+
+    single_right = [{'n': 10, 'x': 0}]
+    result = ops.Join(ops.InnerJoiner(), [])(iter(data_left), iter(single_right))
+    assert list(result) == [
+        {'k': 1, 'x_1': 1, 'n': 10, 'x_2': 0},
+        {'k': 1, 'x_1': 2, 'n': 10, 'x_2': 0},
+        {'k': 2, 'x_1': 3, 'n': 10, 'x_2': 0}
+    ]
+
+
+@pytest.mark.parametrize('kernel', [_kernels.haversine_batch, _kernels.haversine_loop, _kernels.haversine_numpy])
+def test_haversine_kernels(kernel: tp.Callable[..., None]) -> None:
+    mapper = ops.GetHaversineDist(start='start', end='end', res_col_name='distance')
+    rows = [
+        {'start': [37.41463478654623, 55.654487907886505], 'end': [37.41442892700434, 55.654839486815035]},
+        {'start': [37.584684155881405, 55.78285809606314], 'end': [37.58415022864938, 55.78177368734032]},
+        {'start': [37.736429711803794, 55.62696328852326], 'end': [37.9, 55.7]}
+    ]
+    expected = [mapper.apply(dict(row))['distance'] for row in rows]  # type: ignore
+
+    start = np.array([row['start'] for row in rows])
+    end = np.array([row['end'] for row in rows])
+    out = np.empty(len(rows))
+    kernel(start[:, 0], start[:, 1], end[:, 0], end[:, 1], out)
+    if kernel is _kernels.haversine_numpy:
+        assert out.tolist() == approx(expected, rel=1e-12)
+    else:
+        assert out.tolist() == expected